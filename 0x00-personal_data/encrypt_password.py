@@ -2,12 +2,25 @@
 """encrypt_password module"""
 
 import bcrypt
+import os
+
+
+def _bcrypt_rounds() -> int:
+    """Cost factor from BCRYPT_ROUNDS, the bcrypt default 12 if invalid"""
+    try:
+        rounds = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    except (ValueError, TypeError):
+        rounds = 12
+    return rounds if 4 <= rounds <= 31 else 12
+
+
+BCRYPT_ROUNDS = _bcrypt_rounds()
 
 
 def hash_password(password: str) -> bytes:
     """Takes a password and returns a salted, hashed password as byte string"""
     password_bytes = password.encode("utf-8")
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
 
     return hashed
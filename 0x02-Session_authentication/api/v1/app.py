@@ -4,7 +4,8 @@ Route module for the API
 """
 from os import getenv
 from api.v1.views import app_views
-from flask import Flask, jsonify, abort, request
+from api.v1.auth.path_matcher import PathMatcher
+from flask import Flask, jsonify, abort, g, request
 from flask_cors import (CORS, cross_origin)
 import os
 
@@ -33,6 +34,13 @@ if auth_type:
         from api.v1.auth.auth import Auth
         auth = Auth()
 
+excluded_paths = PathMatcher([
+        "/api/v1/status/",
+        "/api/v1/unauthorized/",
+        "/api/v1/forbidden/",
+        "/api/v1/auth_session/login/"
+        ])
+
 
 @app.errorhandler(404)
 def not_found(error) -> str:
@@ -62,12 +70,6 @@ def before_request():
     if auth is None:
         return
 
-    excluded_paths = [
-            "/api/v1/status/",
-            "/api/v1/unauthorized/",
-            "/api/v1/forbidden/",
-            "/api/v1/auth_session/login/"
-            ]
     if not auth.require_auth(request.path, excluded_paths):
         return
 
@@ -75,10 +77,24 @@ def before_request():
             auth.session_cookie(request) is None:
         abort(401)
 
-    if auth.current_user(request) is None:
+    current_user = auth.resolve_user(request)
+    if current_user is None:
         abort(403)
 
-    request.current_user = auth.current_user(request)
+    request.current_user = current_user
+
+
+@app.after_request
+def after_request(response):
+    """ Exposes the authentication phase timings of the request in a
+    Server-Timing header when AUTH_SERVER_TIMING is set
+    """
+    timings = g.get("auth_timings")
+    if timings and os.getenv("AUTH_SERVER_TIMING"):
+        response.headers["Server-Timing"] = ", ".join(
+            "auth_{};dur={:.3f}".format(phase, seconds * 1000)
+            for phase, seconds in timings.items())
+    return response
 
 
 if __name__ == "__main__":
@@ -1,16 +1,21 @@
 #!/usr/bin/env python3
 """ Module for Auth class to manage API authentication
 """
-from flask import request
-from typing import List, TypeVar
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from typing import List, TypeVar, Union
+from api.v1.auth.path_matcher import PathMatcher
 import os
+import time
 
 
 class Auth:
     """ Template for authentication system
     """
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher]) -> bool:
         """ Determines if authentication is required for a given path
+        Pass a PathMatcher to reuse the compiled excluded paths across calls
         """
         if path is None or excluded_paths is None or len(excluded_paths) == 0:
             return True
@@ -18,34 +23,74 @@ class Auth:
         if not path.endswith("/"):
             path = path + "/"
 
-        wildcard_paths = [wc_path for wc_path in excluded_paths
-                          if wc_path.endswith("*")]
-        if len(wildcard_paths) > 0:
-            for wc_path in wildcard_paths:
-                if path.startswith(wc_path[:-1]):
-                    return False
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = PathMatcher(excluded_paths)
 
-        if path not in excluded_paths:
-            return True
+        return not excluded_paths.match(path)
+
+    def request_state(self, request) -> dict:
+        """ Returns the authentication state memoized on a request object:
+        parsed header, cookie and resolved user
+        """
+        state = getattr(request, "auth_state", None)
+        if not isinstance(state, dict):
+            state = {}
+            try:
+                request.auth_state = state
+            except AttributeError:
+                pass
+        return state
 
-        return False
+    @contextmanager
+    def timed(self, phase: str):
+        """ Adds the time spent in the block to the `phase` timing
+        (header_parse, lookup, credential_check) of the current request,
+        available in `g.auth_timings`
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            if has_request_context():
+                timings = g.setdefault("auth_timings", {})
+                timings[phase] = timings.get(phase, 0) + \
+                    time.perf_counter() - started_at
 
     def authorization_header(self, request=None) -> str:
         """ Retrieves authorization header from Flask request object
         """
         if request is None:
             return None
-        return request.headers.get("Authorization")
+        state = self.request_state(request)
+        if "authorization_header" not in state:
+            with self.timed("header_parse"):
+                state["authorization_header"] = \
+                    request.headers.get("Authorization")
+        return state["authorization_header"]
 
     def current_user(self, request=None) -> TypeVar('User'):
         """ Retrieves current user from Flask request object
         """
         return None
 
+    def resolve_user(self, request=None) -> TypeVar('User'):
+        """ Returns `current_user(request)`, resolved once per request
+        """
+        if request is None:
+            return self.current_user(request)
+        state = self.request_state(request)
+        if "current_user" not in state:
+            state["current_user"] = self.current_user(request)
+        return state["current_user"]
+
     def session_cookie(self, request=None):
         """ Returns a cookie value from a request
         """
         if request is None:
             return None
-        session_name = os.getenv("SESSION_NAME")
-        return request.cookies.get(session_name)
+        state = self.request_state(request)
+        if "session_cookie" not in state:
+            with self.timed("header_parse"):
+                session_name = os.getenv("SESSION_NAME")
+                state["session_cookie"] = request.cookies.get(session_name)
+        return state["session_cookie"]
@@ -2,7 +2,12 @@
 """ Module for BasicAuth class to handle `basic_auth` `AUTH_TYPE`
 """
 import base64
+import hashlib
+import hmac
+import os
+import secrets
 from api.v1.auth.auth import Auth
+from api.v1.auth.ttl_cache import TTLCache
 from models.user import User
 from typing import TypeVar
 
@@ -10,6 +15,24 @@ from typing import TypeVar
 class BasicAuth(Auth):
     """ Basic auth authentication system
     """
+    def __init__(self):
+        """ Initialize BasicAuth instance and its verified credentials cache
+
+        The cache maps a HMAC of the raw Authorization header (never the
+        credentials themselves) to the user it was verified for, for at
+        most BASIC_AUTH_CACHE_TTL seconds and BASIC_AUTH_CACHE_SIZE entries
+        """
+        try:
+            cache_size = int(os.getenv("BASIC_AUTH_CACHE_SIZE", "1024"))
+        except (ValueError, TypeError):
+            cache_size = 1024
+        try:
+            cache_ttl = int(os.getenv("BASIC_AUTH_CACHE_TTL", "60"))
+        except (ValueError, TypeError):
+            cache_ttl = 60
+        self._cache_key = secrets.token_bytes(32)
+        self._verified = TTLCache(cache_size, cache_ttl)
+
     def extract_base64_authorization_header(self, authorization_header: str
                                             ) -> str:
         """
@@ -58,17 +81,46 @@ class BasicAuth(Auth):
         if not user_pwd or not isinstance(user_pwd, str):
             return None
 
-        try:
-            users = User.search({"email": user_email})
-        except KeyError:
-            return None
+        with self.timed("lookup"):
+            try:
+                users = User.search({"email": user_email})
+            except KeyError:
+                return None
 
-        for user in users:
-            if user.is_valid_password(user_pwd):
-                return user
+        with self.timed("credential_check"):
+            for user in users:
+                if user.is_valid_password(user_pwd):
+                    return user
 
         return None
 
+    def _header_digest(self, authorization_header: str) -> bytes:
+        """ Returns the cache key of an Authorization header
+        """
+        return hmac.new(self._cache_key, authorization_header.encode(),
+                        hashlib.sha256).digest()
+
+    def cached_user(self, header_digest: bytes) -> TypeVar('User'):
+        """ Returns the User verified for a header digest, if still valid
+        """
+        entry = self._verified.get(header_digest)
+        if entry is None:
+            return None
+
+        user_id, email, pwd_hash = entry
+        user = User.get(user_id)
+        # Removed user, changed email or password: verify again
+        if user is None or user.email != email or user.password != pwd_hash:
+            self._verified.pop(header_digest)
+            return None
+        return user
+
+    def cache_user(self, header_digest: bytes, user: TypeVar('User')):
+        """ Remembers the User verified for a header digest
+        """
+        self._verified.set(header_digest,
+                           (user.id, user.email, user.password))
+
     def current_user(self, request=None) -> TypeVar('User'):
         """ Overloads Auth and retrieves the User instance for a request
         """
@@ -76,26 +128,33 @@ class BasicAuth(Auth):
         if not auth_header:
             return None
 
-        base64_auth_header = self.extract_base64_authorization_header(
-                auth_header
-                )
-        if not base64_auth_header:
-            return None
+        with self.timed("lookup"):
+            header_digest = self._header_digest(auth_header)
+            current_user = self.cached_user(header_digest)
+        if current_user is not None:
+            return current_user
 
-        decoded_base64_auth_header = self.decode_base64_authorization_header(
-                base64_auth_header
-                )
-        if not decoded_base64_auth_header:
-            return None
+        with self.timed("header_parse"):
+            base64_auth_header = self.extract_base64_authorization_header(
+                    auth_header
+                    )
+            if not base64_auth_header:
+                return None
 
-        user_email, user_pwd = self.extract_user_credentials(
-                decoded_base64_auth_header
-                )
-        if not user_email or not user_pwd:
-            return None
+            decoded_base64_auth_header = \
+                self.decode_base64_authorization_header(base64_auth_header)
+            if not decoded_base64_auth_header:
+                return None
+
+            user_email, user_pwd = self.extract_user_credentials(
+                    decoded_base64_auth_header
+                    )
+            if not user_email or not user_pwd:
+                return None
 
         current_user = self.user_object_from_credentials(user_email, user_pwd)
         if not current_user:
             return None
 
+        self.cache_user(header_digest, current_user)
         return current_user
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+""" Module for PathMatcher class to match paths excluded from authentication
+"""
+from typing import List
+
+
+class PathMatcher:
+    """ Excluded paths compiled once for `Auth.require_auth`
+
+    Exact paths go in a set and wildcard paths (ending with `*`) in a prefix
+    trie, so matching a path costs O(len(path)) whatever the number of rules
+    """
+    _END = None
+
+    def __init__(self, excluded_paths: List[str]):
+        """ Compile the excluded paths
+        """
+        self.excluded_paths = tuple(excluded_paths)
+        self._exact = frozenset(self.excluded_paths)
+        self._prefixes = {}
+        for excluded_path in self.excluded_paths:
+            if not excluded_path.endswith("*"):
+                continue
+            node = self._prefixes
+            for char in excluded_path[:-1]:
+                node = node.setdefault(char, {})
+            node[self._END] = True
+
+    def __len__(self) -> int:
+        """ Number of excluded paths
+        """
+        return len(self.excluded_paths)
+
+    def match(self, path: str) -> bool:
+        """ Determines if a (slash terminated) path is excluded
+        """
+        node = self._prefixes
+        if self._END in node:
+            return True
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                break
+            if self._END in node:
+                return True
+        return path in self._exact
@@ -35,10 +35,11 @@ class SessionAuth(Auth):
         session_id = self.session_cookie(request)
         if session_id is None:
             return None
-        user_id = self.user_id_for_session_id(session_id)
-        if user_id is None:
-            return None
-        return User.get(user_id)
+        with self.timed("lookup"):
+            user_id = self.user_id_for_session_id(session_id)
+            if user_id is None:
+                return None
+            return User.get(user_id)
 
     def destroy_session(self, request=None):
         """ Deletes the user session (logs user out)
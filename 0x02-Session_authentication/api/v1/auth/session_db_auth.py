@@ -3,7 +3,10 @@
 """
 
 from datetime import datetime, timedelta
+import os
 from api.v1.auth.session_exp_auth import SessionExpAuth
+from api.v1.auth.session_sweeper import start_session_sweeper
+from api.v1.auth.ttl_cache import TTLCache
 from models.user_session import UserSession
 
 
@@ -11,6 +14,34 @@ class SessionDBAuth(SessionExpAuth):
     """ SessionDBAuth class
     """
 
+    def __init__(self):
+        """ Initialize SessionDBAuth instance, load the stored sessions and
+        set up the read-through cache of (user_id, created_at) by Session ID
+
+        With several workers sharing a database, a session destroyed by
+        another worker stays valid here for up to SESSION_CACHE_TTL seconds
+        """
+        super().__init__()
+        try:
+            cache_size = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+        except (ValueError, TypeError):
+            cache_size = 10000
+        try:
+            cache_ttl = int(os.getenv("SESSION_CACHE_TTL", "5"))
+        except (ValueError, TypeError):
+            cache_ttl = 5
+        self._session_cache = TTLCache(cache_size, cache_ttl)
+        UserSession.load_from_file()
+
+        # Expired UserSession objects are deleted every SESSION_GC_INTERVAL
+        # seconds, never if it is 0
+        try:
+            gc_interval = int(os.getenv("SESSION_GC_INTERVAL", "0"))
+        except (ValueError, TypeError):
+            gc_interval = 0
+        if gc_interval > 0 and self.session_duration > 0:
+            start_session_sweeper(self.session_duration, gc_interval)
+
     def create_session(self, user_id=None):
         """ Creates and stores a new instance of UserSession,
         returns Session ID
@@ -21,6 +52,8 @@ class SessionDBAuth(SessionExpAuth):
 
         user_session = UserSession(user_id=user_id, session_id=session_id)
         user_session.save()
+        self._session_cache.set(user_session.session_id,
+                                (user_id, user_session.created_at))
         return user_session.session_id
 
     def user_id_for_session_id(self, session_id=None):
@@ -30,24 +63,30 @@ class SessionDBAuth(SessionExpAuth):
         if session_id is None:
             return None
 
-        sessions = UserSession.search({"session_id": session_id})
-        if not sessions:
-            return None
+        cached = self._session_cache.get(session_id)
+        if cached is None:
+            # Indexed on session_id, no scan of the stored sessions
+            sessions = UserSession.search({"session_id": session_id})
+            if not sessions:
+                return None
+            cached = (sessions[0].user_id, sessions[0].created_at)
+            self._session_cache.set(session_id, cached)
 
-        user_session = sessions[0]
+        user_id, created_at = cached
 
         if self.session_duration <= 0:
-            return user_session.user_id
+            return user_id
 
-        if not user_session.created_at:
+        if not created_at:
             return None
 
-        expiration_time = user_session.created_at + \
+        # UserSession.created_at is in UTC
+        expiration_time = created_at + \
             timedelta(seconds=self.session_duration)
-        if expiration_time < datetime.now():
+        if expiration_time < datetime.utcnow():
             return None
 
-        return user_session.user_id
+        return user_id
 
     def destroy_session(self, request=None):
         """ Destroys the UserSession based on Session ID from  request cookie
@@ -64,6 +103,8 @@ class SessionDBAuth(SessionExpAuth):
             return False
 
         user_session = sessions[0]
+        # remove() persists the change, no extra save_to_file
         user_session.remove()
-        UserSession.save_to_file()
+        self._session_cache.pop(session_id)
+        self.user_id_by_session_id.pop(session_id)
         return True
@@ -5,6 +5,7 @@
 from datetime import datetime, timedelta
 import os
 from api.v1.auth.session_auth import SessionAuth
+from api.v1.auth.session_store import SessionStore
 
 
 class SessionExpAuth(SessionAuth):
@@ -18,6 +19,13 @@ class SessionExpAuth(SessionAuth):
             self.session_duration = int(os.getenv("SESSION_DURATION", "0"))
         except (ValueError, TypeError):
             self.session_duration = 0
+        try:
+            sweep_interval = int(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+        except (ValueError, TypeError):
+            sweep_interval = 60
+        # Expired sessions are evicted instead of kept forever
+        self.user_id_by_session_id = SessionStore(self.session_duration,
+                                                  sweep_interval)
 
     def create_session(self, user_id=None):
         """ Creates a session id and store time it was created
@@ -55,3 +63,8 @@ class SessionExpAuth(SessionAuth):
             return None
 
         return session_dict.get("user_id")
+
+    def session_stats(self) -> dict:
+        """ Returns the number of live and evicted in-memory sessions
+        """
+        return self.user_id_by_session_id.stats()
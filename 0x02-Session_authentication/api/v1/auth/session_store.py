@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+""" Module for SessionStore class, in-memory sessions with expiry
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class SessionStore:
+    """ Session ID -> session mapping evicting sessions past their duration
+
+    All sessions live for the same duration, so creation order is also
+    expiry order: sessions are kept in an OrderedDict and expired ones are
+    popped from its front. Create, lookup and destroy are O(1), and each
+    session is evicted at most once.
+    """
+
+    def __init__(self, duration: int = 0, sweep_interval: int = 60):
+        """ Initialize a SessionStore, sessions never expire if
+        `duration` <= 0, expired ones are also swept in a background
+        thread every `sweep_interval` seconds if it is > 0
+        """
+        self.duration = duration
+        self.evicted = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        if duration > 0 and sweep_interval > 0:
+            sweeper = threading.Thread(target=self._sweep_forever,
+                                       args=(sweep_interval,), daemon=True)
+            sweeper.start()
+
+    def __len__(self) -> int:
+        """ Number of sessions, expired ones not swept yet included
+        """
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        """ Determines if a session exists and hasn't expired
+        """
+        return self.get(session_id) is not None
+
+    def __setitem__(self, session_id: str, session):
+        """ Creates a session, or replaces the value of an existing one
+        without extending it
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions[session_id] = (entry[0], session)
+                return
+            self._sessions[session_id] = (time.monotonic() + self.duration,
+                                          session)
+            self._sweep()
+
+    def __getitem__(self, session_id: str):
+        """ Returns a session, KeyError if unknown or expired
+        """
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __delitem__(self, session_id: str):
+        """ Destroys a session
+        """
+        with self._lock:
+            del self._sessions[session_id]
+
+    def pop(self, session_id: str, default=None):
+        """ Destroys a session if it exists, returns its value or `default`
+        """
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return default
+        return entry[1]
+
+    def get(self, session_id: str, default=None):
+        """ Returns a session, or `default` if unknown or expired
+        """
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return default
+        if self.duration > 0 and entry[0] <= time.monotonic():
+            with self._lock:
+                if self._sessions.pop(session_id, None) is not None:
+                    self.evicted += 1
+            return default
+        return entry[1]
+
+    def stats(self) -> dict:
+        """ Returns the number of live and evicted sessions
+        """
+        return {"live": len(self._sessions), "evicted": self.evicted}
+
+    def sweep(self) -> int:
+        """ Evicts expired sessions, returns how many were evicted
+        """
+        with self._lock:
+            return self._sweep()
+
+    def _sweep(self) -> int:
+        """ Evicts expired sessions, lock held
+        """
+        if self.duration <= 0:
+            return 0
+        now = time.monotonic()
+        count = 0
+        while self._sessions:
+            session_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[session_id]
+            count += 1
+        self.evicted += count
+        return count
+
+    def _sweep_forever(self, interval: int):
+        """ Background sweeper loop
+        """
+        while True:
+            time.sleep(interval)
+            self.sweep()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+""" Module to delete expired UserSession objects from storage
+
+Run standalone with:
+    SESSION_DURATION=<seconds> python3 -m api.v1.auth.session_sweeper
+With the JSON store, only run it while the API is stopped: a running API
+keeps its own copy of the sessions and writes it back on the next save.
+"""
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+import traceback
+from models.base import PERSISTENCE_MODE
+from models.user_session import UserSession
+
+
+def sweep_expired_sessions(session_duration: int,
+                           batch_size: int = 500) -> dict:
+    """ Deletes the UserSession objects created more than
+    `session_duration` seconds ago, in batches of `batch_size`, and compacts
+    the storage in a single write.
+    Returns the number of rows and bytes reclaimed.
+    """
+    if session_duration <= 0:
+        return {"rows": 0, "bytes": 0}
+
+    expired_before = datetime.utcnow() - timedelta(seconds=session_duration)
+    size_before = UserSession.storage_size()
+    expired = UserSession.query([("created_at", "<", expired_before)])
+    rows = UserSession.remove_many(expired, batch_size)
+    if rows > 0 and PERSISTENCE_MODE == "journal":
+        # Fold the removal records into the snapshot
+        UserSession.save_to_file()
+
+    return {
+        "rows": rows,
+        "bytes": max(size_before - UserSession.storage_size(), 0)
+    }
+
+
+def start_session_sweeper(session_duration: int,
+                          interval: int) -> threading.Thread:
+    """ Runs `sweep_expired_sessions` every `interval` seconds in a
+    background thread, a failed sweep is reported and retried on the next
+    round
+    """
+    def _sweep_forever():
+        while True:
+            time.sleep(interval)
+            try:
+                sweep_expired_sessions(session_duration)
+            except Exception:
+                traceback.print_exc()
+
+    sweeper = threading.Thread(target=_sweep_forever, daemon=True)
+    sweeper.start()
+    return sweeper
+
+
+if __name__ == "__main__":
+    try:
+        duration = int(os.getenv("SESSION_DURATION", "0"))
+    except (ValueError, TypeError):
+        duration = 0
+    UserSession.load_from_file()
+    reclaimed = sweep_expired_sessions(duration)
+    print("Reclaimed {} sessions, {} bytes".format(reclaimed["rows"],
+                                                   reclaimed["bytes"]))
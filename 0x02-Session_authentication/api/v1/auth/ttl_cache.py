@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+""" Module for TTLCache class, a bounded LRU cache with expiring entries
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    """ Thread-safe LRU cache of at most `size` entries, each expiring
+    `ttl` seconds after it was set. A size or ttl <= 0 disables it.
+    """
+
+    def __init__(self, size: int, ttl: int):
+        """ Initialize an empty TTLCache
+        """
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """ Number of entries, expired ones included
+        """
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """ Returns the value cached for `key`, or `default`
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        """ Caches `value` for `key`, evicting the least recently used
+        entries over the size limit
+        """
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """ Removes and returns the value cached for `key`
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        return entry[1]
@@ -19,10 +19,14 @@ def stats() -> str:
     """ GET /api/v1/stats
     Return:
       - the number of each objects
+      - under "load", the objects, seconds and peak RSS (KiB) of the last
+        load from file of each class
     """
+    from models.base import LOAD_STATS
     from models.user import User
     stats = {}
     stats['users'] = User.count()
+    stats['load'] = dict(LOAD_STATS)
     return jsonify(stats)
 
 
@@ -2,18 +2,142 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, jsonify, request, Response
 from models.user import User
+from typing import Iterable
+from urllib.parse import urlencode
+import hashlib
+
+USERS_PAGE_MAX = 1000
+USERS_BULK_MAX = 10000
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+def _etag(*parts) -> str:
+    """ Strong entity tag of the representation identified by `parts`
+    """
+    key = "|".join(str(part) for part in parts)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _not_modified(etag: str) -> Response:
+    """ Returns a 304 response if the client already has the
+    representation tagged `etag`, None otherwise
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def _user_response(user: User) -> Response:
+    """ JSON response of a User, conditional on If-None-Match with an
+    entity tag derived from its representation
+    """
+    etag = _etag(user.to_json_string())
+    response = _not_modified(etag)
+    if response is None:
+        response = jsonify(user.to_json())
+        response.set_etag(etag)
+    return response
+
+
+def _chunks(pieces: Iterable[str]) -> Iterable[str]:
+    """ Groups the strings of `pieces` in chunks of about
+    STREAM_CHUNK_SIZE characters, so that a streamed response isn't
+    written to the socket one User at a time
+    """
+    chunk = []
+    size = 0
+    for piece in pieces:
+        chunk.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def _json_array(users: Iterable[User]) -> Iterable[str]:
+    """ Generator of the JSON array of `users`, piece by piece
+    """
+    separator = "["
+    for user in users:
+        yield separator
+        # Not cached: a full listing would only evict the hot Users
+        yield user.to_json_string(cached=False)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def _ndjson(users: Iterable[User]) -> Iterable[str]:
+    """ Generator of `users` as newline delimited JSON
+    """
+    for user in users:
+        yield user.to_json_string(cached=False)
+        yield "\n"
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: maximum number of Users, between 1 and USERS_PAGE_MAX
+      - after: cursor, ID of the last User of the previous page
+      - stream: "ndjson" or "json", to stream the Users while they are
+        serialized instead of building the whole response first
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, ordered by ID when
+        paginated, with a Link header to the next page if it's full
+      - 304 if If-None-Match has the ETag of the list, derived from the
+        version of the User table and the query parameters
+      - 400 if a query parameter is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get("limit")
+    after = request.args.get("after")
+    stream = request.args.get("stream")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1 or limit > USERS_PAGE_MAX:
+            return jsonify({'error': "limit must be between 1 and {}"
+                            .format(USERS_PAGE_MAX)}), 400
+    if stream not in (None, "ndjson", "json"):
+        return jsonify({'error': "stream must be ndjson or json"}), 400
+
+    etag = _etag(User.version(), request.query_string.decode())
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    if limit is None and after is None:
+        users = User.all()
+    else:
+        where = [] if after is None else [("id", ">", after)]
+        users = User.query(where, order_by="id", limit=limit)
+
+    if stream == "ndjson":
+        response = Response(_chunks(_ndjson(users)),
+                            mimetype="application/x-ndjson")
+    elif stream == "json":
+        response = Response(_chunks(_json_array(users)),
+                            mimetype="application/json")
+    else:
+        response = Response("".join(_json_array(users)),
+                            mimetype="application/json")
+
+    response.set_etag(etag)
+    if limit is not None and len(users) == limit:
+        args = request.args.to_dict()
+        args["after"] = users[-1].id
+        response.headers["Link"] = '<{}?{}>; rel="next"'.format(
+            request.base_url, urlencode(args))
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -22,7 +146,8 @@ def view_one_user(user_id: str = None) -> str:
     Path parameter:
       - User ID
     Return:
-      - User object JSON represented
+      - User object JSON represented, with an ETag
+      - 304 if If-None-Match has the ETag of the User
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -31,12 +156,12 @@ def view_one_user(user_id: str = None) -> str:
     if user_id == "me":
         if request.current_user is None:
             abort(404)
-        return jsonify(request.current_user.to_json())
+        return _user_response(request.current_user)
 
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return _user_response(user)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -126,3 +251,93 @@ def update_user(user_id: str = None) -> str:
         user.last_name = rj.get('last_name')
     user.save()
     return jsonify(user.to_json()), 200
+
+
+def _bulk_items(expected: type) -> list:
+    """ Returns the JSON list of the request body if it only contains
+    items of type `expected`, None otherwise
+    """
+    try:
+        items = request.get_json()
+    except Exception as e:
+        items = None
+    if type(items) is not list or len(items) > USERS_BULK_MAX:
+        return None
+    if not all(type(item) is expected for item in items):
+        return None
+    return items
+
+
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+def create_users() -> str:
+    """ POST /api/v1/users/bulk
+    JSON body:
+      - list of at most USERS_BULK_MAX objects with:
+        - email
+        - password
+        - last_name (optional)
+        - first_name (optional)
+    Every User is validated before any is created, all are then saved
+    with a single write
+    Return:
+      - list of the User objects JSON represented, in the body order
+      - 400 if the body isn't a list of objects, or with the list of
+        {"error": ...} or {} results per object if any is invalid
+    """
+    rj = _bulk_items(dict)
+    if rj is None:
+        return jsonify({'error': "Wrong format"}), 400
+
+    results = []
+    for item in rj:
+        if item.get("email", "") == "":
+            results.append({'error': "email missing"})
+        elif item.get("password", "") == "":
+            results.append({'error': "password missing"})
+        else:
+            results.append({})
+    if any(results):
+        return jsonify(results), 400
+
+    users = []
+    for item in rj:
+        user = User()
+        user.email = item.get("email")
+        user.password = item.get("password")
+        user.first_name = item.get("first_name")
+        user.last_name = item.get("last_name")
+        users.append(user)
+    try:
+        User.save_many(users)
+    except Exception as e:
+        return jsonify({'error': "Can't create Users: {}".format(e)}), 400
+    return Response("".join(_json_array(users)), status=201,
+                    mimetype="application/json")
+
+
+@app_views.route('/users/bulk', methods=['DELETE'], strict_slashes=False)
+def delete_users() -> str:
+    """ DELETE /api/v1/users/bulk
+    JSON body:
+      - list of at most USERS_BULK_MAX User IDs
+    All existing Users are deleted with a single write
+    Return:
+      - list of {"id": ..., "deleted": true} or {"id": ..., "error":
+        "Not found"} results, in the body order
+      - 400 if the body isn't a list of IDs
+    """
+    ids = _bulk_items(str)
+    if ids is None:
+        return jsonify({'error': "Wrong format"}), 400
+
+    users = {}
+    results = []
+    for user_id in ids:
+        user = users.get(user_id) or User.get(user_id)
+        if user is None:
+            results.append({'id': user_id, 'error': "Not found"})
+        else:
+            users[user_id] = user
+            results.append({'id': user_id, 'deleted': True})
+    User.remove_many(users.values())
+    return jsonify(results), 200
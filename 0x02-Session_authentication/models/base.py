@@ -1,37 +1,304 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from collections import OrderedDict
+from contextlib import nullcontext
 from datetime import datetime
+from itertools import islice
 from typing import TypeVar, List, Iterable
 from os import path
+import atexit
+import heapq
 import json
+import operator
+import os
+import resource
+import threading
+import time
+import traceback
 import uuid
+from models.lazy_table import LazyTable
+from models.sqlite_table import SQLiteTable
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+JOURNAL_SIZES = {}
+# Last load_from_file figures per class: objects, seconds, peak_rss_kb
+LOAD_STATS = {}
+LOAD_CHUNK_SIZE = 1 << 16
+# Characters that may continue a JSON number cut by the end of a chunk
+_NUMBER_CHARS = "0123456789.eE+-"
+
+# "snapshot" rewrites .db_<Class>.json on every change, "journal" appends
+# one record per change to .db_<Class>.journal and compacts it into the
+# snapshot every DB_JOURNAL_COMPACT records
+PERSISTENCE_MODE = os.getenv("DB_PERSISTENCE", "snapshot")
+try:
+    JOURNAL_COMPACT = int(os.getenv("DB_JOURNAL_COMPACT", "1000"))
+except (ValueError, TypeError):
+    JOURNAL_COMPACT = 1000
+
+# With a positive DB_LAZY_CACHE_SIZE, DATA holds a LazyTable per class:
+# only file locations stay in memory and at most that many objects are
+# materialized at once. 0 keeps every object in memory.
+try:
+    LAZY_CACHE_SIZE = int(os.getenv("DB_LAZY_CACHE_SIZE", "0"))
+except (ValueError, TypeError):
+    LAZY_CACHE_SIZE = 0
+
+# "json" keeps objects in DATA and the .db_<Class>.json/.journal files,
+# "sqlite" stores them in the DB_SQLITE_PATH database shared between
+# processes, with DATA only holding a SQLiteTable per class
+BACKEND = os.getenv("DB_BACKEND", "json")
+SQLITE_PATH = os.getenv("DB_SQLITE_PATH", ".db.sqlite3")
+
+# Write-behind: with a positive DB_WRITE_BEHIND interval (seconds), save()
+# and remove() of the JSON store only mark the object dirty, and a
+# background thread persists the dirty objects in one write per class every
+# interval, or as soon as DB_WRITE_BEHIND_MAX_DIRTY changes are pending.
+# Changes not flushed yet are lost on a crash: the durability window is at
+# most that interval or that many changes, see Base.pending_writes().
+# Base.flush() persists them immediately, and they are flushed at exit.
+try:
+    WRITE_BEHIND = float(os.getenv("DB_WRITE_BEHIND", "0"))
+except (ValueError, TypeError):
+    WRITE_BEHIND = 0
+try:
+    WRITE_BEHIND_MAX_DIRTY = int(os.getenv("DB_WRITE_BEHIND_MAX_DIRTY",
+                                           "1000"))
+except (ValueError, TypeError):
+    WRITE_BEHIND_MAX_DIRTY = 1000
+# Model class -> {id: (op, obj)} changes not persisted yet
+DIRTY = {}
+DIRTY_SINCE = {}
+_dirty_lock = threading.Lock()
+_flush_needed = threading.Event()
+_flusher = None
+
+# Per-class writer locks serializing snapshot and journal writes, and
+# [requested, written] snapshot generations used to coalesce concurrent
+# save_to_file calls into a single write
+WRITER_LOCKS = {}
+SNAPSHOT_GENERATIONS = {}
+_generations_lock = threading.Lock()
+
+# Concurrency of the in-memory store: writers (save, remove,
+# load_from_file) serialize on a per-class lock, readers (get, search,
+# count, all) never lock. Readers work on atomic copies of the table or
+# index entries, skip IDs removed meanwhile and check the attributes of
+# every candidate, and load_from_file swaps complete new structures in.
+DATA_LOCKS = {}
+# Model class name -> random token replaced on every change of its
+# in-memory table, see Base.version()
+VERSIONS = {}
+
+# Operators of Base.query predicates, from the usually most selective one
+QUERY_OPERATORS = ("==", "startswith", "<", "<=", ">", ">=")
+_COMPARISONS = {"<": operator.lt, "<=": operator.le,
+                ">": operator.gt, ">=": operator.ge}
+_MISSING = object()
+
+# Model class -> attrgetter of its attributes, see Base._fingerprint
+_FINGERPRINTS = {}
+
+# Public to_json_string() of the DB_JSON_CACHE_SIZE objects serialized most
+# recently: (class name, id) -> (fingerprint, string), reused as long as
+# the attribute values are the same. 0 disables the cache.
+try:
+    JSON_CACHE_SIZE = int(os.getenv("DB_JSON_CACHE_SIZE", "1000"))
+except (ValueError, TypeError):
+    JSON_CACHE_SIZE = 1000
+JSON_CACHE = OrderedDict()
+_json_cache_lock = threading.Lock()
+
+
+def flush_all():
+    """ Persist the pending changes of every model class
+    """
+    for cls in list(DIRTY):
+        cls.flush()
+
+
+def _flush_forever():
+    """ Write-behind flusher loop, a failed write is reported and retried
+    on the next round
+    """
+    while True:
+        _flush_needed.wait(WRITE_BEHIND)
+        _flush_needed.clear()
+        try:
+            flush_all()
+        except Exception:
+            traceback.print_exc()
+
+
+def _drop_from_index(by_value: dict, value, obj_id: str):
+    """ Remove an object ID from the IDs indexed under `value`
+    """
+    ids = by_value.get(value)
+    if ids is None:
+        return
+    ids.pop(obj_id, None)
+    if len(ids) == 0:
+        del by_value[value]
+
+
+def _predicate(op: str, operand):
+    """ Return the test of the query predicate `value <op> operand`,
+    None or values of another type only match "=="
+    """
+    if op == "==":
+        return lambda value: value == operand
+    if op == "startswith":
+        return lambda value: type(value) is str and value.startswith(operand)
+    compare = _COMPARISONS[op]
+
+    def _compare(value):
+        try:
+            return value is not None and compare(value, operand)
+        except TypeError:
+            return False
+    return _compare
+
+
+def _sorted(items: list, keys: list, descending: bool = False,
+            count: int = None) -> list:
+    """ Stable sort of `items` by `keys`, None first as SQLite does,
+    only the first `count` items are selected if it isn't None
+    """
+    def _select(key):
+        if count is None:
+            return sorted(range(len(items)), key=key, reverse=descending)
+        if descending:
+            return heapq.nlargest(count, range(len(items)), key=key)
+        return heapq.nsmallest(count, range(len(items)), key=key)
+
+    try:
+        order = _select(keys.__getitem__)
+    except TypeError:
+        order = _select(lambda i: (keys[i] is not None, keys[i]))
+    return [items[i] for i in order]
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string, without strptime when possible
+    """
+    if len(value) == 19 and value[10] == 'T':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def iter_json_object(f, chunk_size: int = LOAD_CHUNK_SIZE,
+                     with_offsets: bool = False) -> Iterable:
+    """ Yield the (key, value) pairs of the JSON object stored in file `f`
+    one at a time, reading it by chunks instead of parsing it whole.
+    With `with_offsets`, yield (key, value, offset, length) where offset
+    and length locate the value text in the file.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    dropped = 0
+    eof = False
+
+    def _fill():
+        nonlocal buf, pos, dropped, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        dropped += pos
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def _token():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            _fill()
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of JSON object")
+        pos += 1
+        return buf[pos - 1]
+
+    def _value():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # A value touching the end of the buffer may be cut short,
+                # so may a number followed only by number characters
+                # ("12." decodes as 12)
+                if eof or (end < len(buf) and
+                           buf[end:].lstrip(_NUMBER_CHARS) != ""):
+                    pos = end
+                    return value
+            except ValueError:
+                if eof:
+                    raise
+            _fill()
+
+    if _token() != '{':
+        raise ValueError("Expected a JSON object")
+    separator = _token()
+    while separator != '}':
+        pos -= 1
+        key = _value()
+        if _token() != ':':
+            raise ValueError("Expected ':' after object key")
+        _token()
+        pos -= 1
+        start = dropped + pos
+        value = _value()
+        if with_offsets:
+            yield key, value, start, dropped + pos - start
+        else:
+            yield key, value
+        separator = _token()
+        if separator not in (',', '}'):
+            raise ValueError("Expected ',' or '}' in object")
+        if separator == ',':
+            separator = _token()
 
 
 class Base():
     """ Base class
     """
+    # Attributes with a hash index: {value: {id: None}} kept in INDEXES
+    __indexes__ = ()
+    # Attributes only used in range predicates or ordering, indexed by the
+    # backends materializing objects (LazyTable, SQLite): a dictionary
+    # table compares them faster than it maintains their index
+    __range_indexes__ = ()
+    # Models declare their attributes as slots instead of a per-instance
+    # __dict__, to_json serializes them in declaration order
+    __slots__ = ("id", "created_at", "updated_at")
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            with self.__class__._data_lock():
+                if DATA.get(s_class) is None:
+                    INDEXES[s_class] = self.__class__._new_indexes()
+                    DATA[s_class] = self.__class__._new_table()
+                    self.__class__._changed()
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -44,11 +311,59 @@ class Base():
             return False
         return (self.id == other.id)
 
+    def _fingerprint(self) -> tuple:
+        """ Values of the attributes, cached serializations stay valid as
+        long as it doesn't change
+        """
+        getter = _FINGERPRINTS.get(self.__class__)
+        if getter is None:
+            getter = operator.attrgetter(*self.__class__._slot_names())
+            _FINGERPRINTS[self.__class__] = getter
+        extra = getattr(self, "__dict__", None)
+        if extra:
+            return (getter(self), tuple(extra.items()))
+        return getter(self)
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
+        return self._build_json(for_serialization)
+
+    def to_json_string(self, for_serialization: bool = False,
+                       cached: bool = True) -> str:
+        """ Encoded `to_json()`. The public form is kept in JSON_CACHE
+        unless `cached` is False, e.g. for one-off full table listings
+        that would only evict the hot objects
+        """
+        if for_serialization:
+            return json.dumps(self._build_json(True))
+        if not cached or JSON_CACHE_SIZE <= 0:
+            return json.dumps(self._build_json(False))
+        try:
+            fingerprint = self._fingerprint()
+        except AttributeError:
+            # Some attributes aren't set yet
+            return json.dumps(self._build_json(False))
+
+        key = (self.__class__.__name__, self.id)
+        with _json_cache_lock:
+            entry = JSON_CACHE.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                JSON_CACHE.move_to_end(key)
+                return entry[1]
+        value = json.dumps(self._build_json(False))
+        with _json_cache_lock:
+            JSON_CACHE[key] = (fingerprint, value)
+            JSON_CACHE.move_to_end(key)
+            while len(JSON_CACHE) > JSON_CACHE_SIZE:
+                JSON_CACHE.popitem(last=False)
+        return value
+
+    def _build_json(self, for_serialization: bool) -> dict:
+        """ Build the JSON dictionary of the object
+        """
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in self._attributes():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,62 +372,500 @@ class Base():
                 result[key] = value
         return result
 
+    def _attributes(self) -> Iterable[tuple]:
+        """ Generator over the (name, value) pairs of the attributes set,
+        slots first then the __dict__ of models not using slots
+        """
+        for klass in reversed(self.__class__.__mro__):
+            for key in klass.__dict__.get("__slots__", ()):
+                try:
+                    yield key, getattr(self, key)
+                except AttributeError:
+                    continue
+        yield from getattr(self, "__dict__", {}).items()
+
+    @classmethod
+    def _new_table(cls):
+        """ Return an ID -> object table for the class
+
+        Tables are dictionaries or objects implementing the same protocol:
+        get, keys, values, items, len, in, [] assignment and deletion
+        """
+        if BACKEND == "sqlite":
+            return SQLiteTable(cls, SQLITE_PATH)
+        if LAZY_CACHE_SIZE > 0:
+            return LazyTable(cls, LAZY_CACHE_SIZE)
+        return {}
+
+    @classmethod
+    def _data_lock(cls) -> threading.RLock:
+        """ Return the lock serializing the in-memory writes of the class
+        """
+        with _generations_lock:
+            return DATA_LOCKS.setdefault(cls.__name__, threading.RLock())
+
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the journal on top
+        """
+        if WRITE_BEHIND > 0:
+            cls.flush()
+        with cls._data_lock():
+            cls._load_from_file()
+
+    @classmethod
+    def _load_from_file(cls):
+        """ Build the table and indexes of the class from its files and
+        swap them in, data lock held
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        if BACKEND == "sqlite":
+            INDEXES[s_class] = cls._new_indexes()
+            DATA[s_class] = cls._new_table()
             return
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        started_at = time.perf_counter()
+        file_path = ".db_{}.json".format(s_class)
+        objs = cls._new_table()
+        indexes = cls._new_indexes()
+        lazy = isinstance(objs, LazyTable)
+        JOURNAL_SIZES[s_class] = 0
+        if path.exists(file_path):
+            if lazy:
+                # Snapshots are ASCII (json.dump escapes the rest), decoding
+                # them as latin-1 keeps text offsets equal to byte offsets
+                f = open(file_path, 'r', encoding="latin-1", newline='')
+            else:
+                f = open(file_path, 'r')
+            with f:
+                for obj_id, obj_json, offset, length in iter_json_object(
+                        f, with_offsets=True):
+                    obj = cls(**obj_json)
+                    objs[obj_id] = obj
+                    obj._index(indexes)
+                    if lazy:
+                        objs.locate(obj_id, (file_path, offset, length,
+                                             False))
+
+        journal_path = ".db_{}.journal".format(s_class)
+        if path.exists(journal_path):
+            cls._replay_journal(journal_path, objs, indexes)
+
+        previous = DATA.get(s_class)
+        INDEXES[s_class] = indexes
+        DATA[s_class] = objs
+        cls._changed()
+        if isinstance(previous, LazyTable):
+            previous.close_files()
+
+        LOAD_STATS[s_class] = {
+            "objects": len(DATA[s_class]),
+            "seconds": time.perf_counter() - started_at,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        }
+
+    @classmethod
+    def _replay_journal(cls, journal_path: str, objs, indexes: dict):
+        """ Apply the records of the journal to the loaded objects
+        """
+        s_class = cls.__name__
+        offset = 0
+        torn = False
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    torn = True
+                    break
+                obj_id = record["id"]
+                if obj_id in objs:
+                    cls._unindex_id(obj_id, indexes)
+                if record["op"] == "save":
+                    obj = cls(**record["obj"])
+                    objs[obj_id] = obj
+                    obj._index(indexes)
+                    if isinstance(objs, LazyTable):
+                        objs.locate(obj_id, (journal_path, offset, len(line),
+                                             True))
+                elif obj_id in objs:
+                    del objs[obj_id]
+                offset += len(line)
+                JOURNAL_SIZES[s_class] += 1
+
+        if torn:
+            # Drop the torn last record of a crashed append so that the
+            # next records are appended after a complete line
+            with open(journal_path, 'r+b') as f:
+                f.truncate(offset)
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Save all objects to file and truncate the journal
+
+        The snapshot is written to a temporary file, synced and renamed over
+        the previous one, so a crash never leaves a truncated snapshot.
+        Writes are serialized per class and coalesced: a call returns
+        without writing if a write started after it was made.
+        """
+        if BACKEND == "sqlite":
+            return
+
+        s_class = cls.__name__
+        with _generations_lock:
+            generations = SNAPSHOT_GENERATIONS.setdefault(s_class, [0, 0])
+            generations[0] += 1
+            generation = generations[0]
+
+        with cls._writer_lock():
+            if generations[1] >= generation:
+                return
+            # Every change requested so far is in DATA already
+            with _generations_lock:
+                generation = generations[0]
+            cls._write_snapshot()
+            generations[1] = generation
+
+    @classmethod
+    def _writer_lock(cls) -> threading.RLock:
+        """ Return the lock serializing the file writes of the class
+        """
+        with _generations_lock:
+            return WRITER_LOCKS.setdefault(cls.__name__, threading.RLock())
+
+    @classmethod
+    def _write_snapshot(cls):
+        """ Write all objects to the snapshot file, writer lock held
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+        objs = DATA[s_class]
+        lazy = isinstance(objs, LazyTable)
+        locations = {}
+
+        # Same output as json.dump of the whole dictionary, written one
+        # object at a time
+        with open(tmp_path, 'w') as f:
+            f.write('{')
+            offset = 1
+            separator = ""
+            # Copy of the references, request threads may add objects
+            # meanwhile (LazyTable.items already iterates over a copy)
+            items = objs.items() if lazy else list(objs.items())
+            for obj_id, obj in items:
+                prefix = "{}{}: ".format(separator, json.dumps(obj_id))
+                obj_json = obj.to_json_string(True)
+                f.write(prefix)
+                f.write(obj_json)
+                offset += len(prefix)
+                if lazy:
+                    locations[obj_id] = (file_path, offset, len(obj_json),
+                                         False)
+                offset += len(obj_json)
+                separator = ", "
+            f.write('}')
+            f.flush()
+            os.fsync(f.fileno())
+
+        journal_path = ".db_{}.journal".format(s_class)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        def _replace_files():
+            os.replace(tmp_path, file_path)
+            dir_fd = os.open(path.dirname(path.abspath(file_path)),
+                             os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            # Replaying the journal over the new snapshot is idempotent, so
+            # a crash before this point loses nothing
+            if path.exists(journal_path):
+                os.remove(journal_path)
+
+        # Lazy objects are read from the old snapshot and journal while
+        # writing the new snapshot, so they are only replaced once it is
+        # complete, together with the locations pointing into them
+        if lazy:
+            objs.relocate(locations, _replace_files)
+        else:
+            _replace_files()
+        JOURNAL_SIZES[s_class] = 0
+
+    @classmethod
+    def append_to_journal(cls, op: str, obj: TypeVar('Base')):
+        """ Append one change record ("save" or "remove") to the journal,
+        compacting it into the snapshot once it gets too long
+        """
+        cls._append_changes([(op, obj)])
+
+    @classmethod
+    def _append_changes(cls, changes: List[tuple]):
+        """ Append (op, obj) change records to the journal in one write
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        lines = []
+        for op, obj in changes:
+            if op == "save":
+                # Same as json.dumps of the record
+                line = '{{"op": "save", "id": {}, "obj": {}}}\n'.format(
+                    json.dumps(obj.id), obj.to_json_string(True))
+            else:
+                line = "{}\n".format(json.dumps({"op": op, "id": obj.id}))
+            lines.append(line.encode())
+
+        # Under the writer lock so that a compaction can't drop the journal
+        # between a change and its record
+        with cls._writer_lock():
+            with open(journal_path, 'ab') as f:
+                offset = f.tell()
+                f.write(b"".join(lines))
+
+            objs = DATA[s_class]
+            for (op, obj), line in zip(changes, lines):
+                if op == "save" and isinstance(objs, LazyTable):
+                    objs.locate(obj.id, (journal_path, offset, len(line),
+                                         True))
+                offset += len(line)
+
+            JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) + \
+                len(lines)
+            if JOURNAL_SIZES[s_class] >= JOURNAL_COMPACT:
+                cls.save_to_file()
+
+    @classmethod
+    def _persist(cls, op: str, obj: TypeVar('Base')):
+        """ Persist one change, see _persist_many
+        """
+        cls._persist_many([(op, obj)])
+
+    @classmethod
+    def _persist_many(cls, changes: List[tuple]):
+        """ Persist (op, obj) changes according to PERSISTENCE_MODE in a
+        single write, or leave them to the write-behind flusher
+        """
+        if BACKEND == "sqlite" or len(changes) == 0:
+            # Already written by the table
+            return
+        if WRITE_BEHIND > 0:
+            cls._mark_dirty(changes)
+        elif PERSISTENCE_MODE == "journal":
+            cls._append_changes(changes)
+        else:
+            cls.save_to_file()
+
+    @classmethod
+    def _mark_dirty(cls, changes: List[tuple]):
+        """ Record (op, obj) changes for the write-behind flusher
+        """
+        global _flusher
+        with _dirty_lock:
+            dirty = DIRTY.setdefault(cls, {})
+            if len(dirty) == 0:
+                DIRTY_SINCE[cls] = time.monotonic()
+            # Only the last change of an object needs to be written
+            for op, obj in changes:
+                dirty.pop(obj.id, None)
+                dirty[obj.id] = (op, obj)
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_forever,
+                                            daemon=True)
+                _flusher.start()
+                atexit.register(flush_all)
+            if len(dirty) >= WRITE_BEHIND_MAX_DIRTY:
+                _flush_needed.set()
+
+    @classmethod
+    def flush(cls):
+        """ Persist the pending write-behind changes of the class, they are
+        pending again if the write fails
+        """
+        # Under the writer lock so that concurrent flushes write their
+        # changes in the order they were taken
+        with cls._writer_lock():
+            with _dirty_lock:
+                changes = list(DIRTY.get(cls, {}).values())
+                since = DIRTY_SINCE.get(cls)
+                DIRTY[cls] = {}
+            if len(changes) == 0:
+                return
+            try:
+                if PERSISTENCE_MODE == "journal":
+                    cls._append_changes(changes)
+                else:
+                    cls.save_to_file()
+            except BaseException:
+                with _dirty_lock:
+                    # Changes made meanwhile are newer
+                    dirty = {obj.id: (op, obj) for op, obj in changes}
+                    for obj_id, change in DIRTY[cls].items():
+                        dirty.pop(obj_id, None)
+                        dirty[obj_id] = change
+                    DIRTY[cls] = dirty
+                    if since is not None:
+                        DIRTY_SINCE[cls] = since
+                raise
+
+    @classmethod
+    def pending_writes(cls) -> dict:
+        """ Return the number of changes of the class not persisted yet and
+        the age in seconds of the oldest one
+        """
+        with _dirty_lock:
+            changes = len(DIRTY.get(cls, {}))
+            since = DIRTY_SINCE.get(cls)
+        age = 0
+        if changes > 0 and since is not None:
+            age = time.monotonic() - since
+        return {"changes": changes, "oldest_seconds": age}
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with self.__class__._data_lock():
+            DATA[s_class][self.id] = self
+            self._index()
+            self.__class__._changed()
+        self.__class__._persist("save", self)
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
+        with self.__class__._data_lock():
+            if self.id not in DATA[s_class]:
+                return
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            self._unindex()
+            self.__class__._changed()
+        self.__class__._persist("remove", self)
+
+    @classmethod
+    def save_many(cls, objs: Iterable[TypeVar('Base')],
+                  batch_size: int = 500) -> int:
+        """ Save several objects with a single persistence write
+        (one transaction per `batch_size` objects with SQLite),
+        returns the number of objects saved
+        """
+        s_class = cls.__name__
+        table = DATA[s_class]
+        saved = []
+        batch = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                cls._save_batch(table, batch)
+                saved += batch
+                batch = []
+        cls._save_batch(table, batch)
+        saved += batch
+
+        cls._persist_many([("save", obj) for obj in saved])
+        return len(saved)
+
+    @classmethod
+    def _save_batch(cls, table, objs: List[TypeVar('Base')]):
+        """ Add or replace objects in the table without persisting the
+        change, in a single transaction with SQLite
+        """
+        updated_at = datetime.utcnow()
+        transaction = nullcontext()
+        if isinstance(table, SQLiteTable):
+            transaction = table.transaction()
+        with cls._data_lock(), transaction:
+            for obj in objs:
+                obj.updated_at = updated_at
+                table[obj.id] = obj
+                obj._index()
+            cls._changed()
+
+    @classmethod
+    def remove_many(cls, objs: Iterable[TypeVar('Base')],
+                    batch_size: int = 500) -> int:
+        """ Remove several objects with a single persistence write
+        (one transaction per `batch_size` objects with SQLite),
+        returns the number of objects removed
+        """
+        s_class = cls.__name__
+        table = DATA[s_class]
+        removed = []
+        batch = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                removed += cls._remove_batch(table, batch)
+                batch = []
+        removed += cls._remove_batch(table, batch)
+
+        cls._persist_many([("remove", obj) for obj in removed])
+        return len(removed)
+
+    @classmethod
+    def _remove_batch(cls, table,
+                      objs: List[TypeVar('Base')]) -> List[TypeVar('Base')]:
+        """ Remove objects from the table without persisting the change,
+        in a single transaction with SQLite, returns the objects removed
+        """
+        removed = []
+        transaction = nullcontext()
+        if isinstance(table, SQLiteTable):
+            transaction = table.transaction()
+        with cls._data_lock(), transaction:
+            for obj in objs:
+                if obj.id in table:
+                    del table[obj.id]
+                    obj._unindex()
+                    removed.append(obj)
+            cls._changed()
+        return removed
+
+    @classmethod
+    def storage_size(cls) -> int:
+        """ Size in bytes of the files storing the objects of the class
+        (the whole database with SQLite)
+        """
+        if BACKEND == "sqlite":
+            file_paths = [SQLITE_PATH, "{}-wal".format(SQLITE_PATH)]
+        else:
+            file_paths = [".db_{}.json".format(cls.__name__),
+                          ".db_{}.journal".format(cls.__name__)]
+        return sum(path.getsize(p) for p in file_paths if path.exists(p))
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return len(DATA[s_class])
+
+    @classmethod
+    def version(cls) -> str:
+        """ Return a token that changes on every write to the objects of
+        the class, with SQLite including the writes of other processes
+        """
+        objs = DATA[cls.__name__]
+        if isinstance(objs, SQLiteTable):
+            return objs.version()
+        return VERSIONS.get(cls.__name__)
+
+    @classmethod
+    def _changed(cls):
+        """ Record a change of the in-memory table, data lock held
+        """
+        VERSIONS[cls.__name__] = uuid.uuid4().hex
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
-        """ Return all objects
+        """ Return a generator over all objects
         """
-        return cls.search()
+        s_class = cls.__name__
+        objs = DATA[s_class]
+        if isinstance(objs, LazyTable):
+            return objs.values()
+        return (obj for obj in list(objs.values()))
 
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
@@ -122,16 +875,186 @@ class Base():
         return DATA[s_class].get(id)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
-        """ Search all objects with matching attributes
+    def _new_indexes(cls) -> dict:
+        """ Return empty indexes for the class
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
+        if BACKEND == "sqlite":
+            # Indexed columns of the database table replace them
+            return {}
+        attrs = cls.__indexes__
+        if LAZY_CACHE_SIZE > 0:
+            attrs += cls.__range_indexes__
+        return {attr: ({}, {}) for attr in attrs}
+
+    def _index(self, indexes: dict = None):
+        """ Add (or refresh) the current object in the class indexes
+        """
+        if indexes is None:
+            indexes = INDEXES[self.__class__.__name__]
+        for attr, (by_value, by_id) in indexes.items():
+            value = getattr(self, attr, None)
+            indexed = self.id in by_id
+            old_value = by_id.get(self.id)
+            if indexed and old_value == value:
+                continue
+            # Added under the new value before being removed from the old
+            # one, so that concurrent readers always find the object
+            try:
+                by_value.setdefault(value, {})[self.id] = None
+                by_id[self.id] = value
+            except TypeError:
+                by_id.pop(self.id, None)
+            if indexed:
+                _drop_from_index(by_value, old_value, self.id)
+
+    def _unindex(self):
+        """ Remove the current object from the class indexes
+        """
+        self.__class__._unindex_id(self.id)
+
+    @classmethod
+    def _unindex_id(cls, obj_id: str, indexes: dict = None):
+        """ Remove an object ID from the class indexes
+        """
+        if indexes is None:
+            indexes = INDEXES[cls.__name__]
+        for attr, (by_value, by_id) in indexes.items():
+            if obj_id in by_id:
+                _drop_from_index(by_value, by_id.pop(obj_id), obj_id)
+
+    @classmethod
+    def _slot_names(cls) -> List[str]:
+        """ Names of the attributes declared as slots by the class
+        """
+        return [key for klass in reversed(cls.__mro__)
+                for key in klass.__dict__.get("__slots__", ())]
+
+    @classmethod
+    def _candidate_ids(cls, objs, where: List[tuple]) -> List[str]:
+        """ IDs of the objects possibly matching `where`, read from the
+        most selective indexed predicate, or None to scan the table.
+        For tables materializing objects, ranges of index keys are used
+        too and the IDs are pruned with the indexed values of the other
+        predicates, so that only the matching objects get loaded
+        """
+        indexes = INDEXES.get(cls.__name__, {})
+        lazy = not isinstance(objs, dict)
+        best = None
+        for attr, op, value in where:
+            try:
+                if attr == "id" and op == "==":
+                    ids = [value] if value in objs else []
+                elif attr not in indexes:
+                    continue
+                elif op == "==":
+                    ids = list(indexes[attr][0].get(value, ()))
+                elif best is not None or not lazy:
+                    continue
+                else:
+                    test = _predicate(op, value)
+                    ids = {obj_id: None
+                           for key, bucket in list(indexes[attr][0].items())
+                           if test(key)
+                           for obj_id in list(bucket)}
+                    # Back from the index order to the storage order
+                    ids = [obj_id for obj_id in list(objs) if obj_id in ids]
+            except TypeError:
+                continue
+            if best is None or len(ids) < len(best):
+                best = ids
+            if len(best) == 0:
+                return best
+        if not lazy:
+            return best
+
+        if best is None:
+            best = list(objs)
+        for attr, op, value in where:
+            test = _predicate(op, value)
+            if attr == "id":
+                best = [obj_id for obj_id in best if test(obj_id)]
+            elif attr in indexes:
+                by_id = indexes[attr][1]
+                kept = []
+                for obj_id in best:
+                    indexed = by_id.get(obj_id, _MISSING)
+                    if indexed is _MISSING or test(indexed):
+                        kept.append(obj_id)
+                best = kept
+        return best
+
+    @classmethod
+    def query(cls, where: Iterable[tuple] = (), order_by: str = None,
+              descending: bool = False, limit: int = None,
+              offset: int = 0) -> List[TypeVar('Base')]:
+        """ Return the objects matching all the (attribute, operator,
+        value) predicates of `where`, see QUERY_OPERATORS, sorted by the
+        `order_by` attribute (storage order by default) then sliced by
+        `offset` and `limit`
+        """
+        where = list(where)
+        for _, op, _ in where:
+            if op not in QUERY_OPERATORS:
+                raise ValueError("Unknown query operator: {}".format(op))
+        where = sorted(where, key=lambda p: QUERY_OPERATORS.index(p[1]))
+        stop = None if limit is None else offset + limit
+
+        objs = DATA[cls.__name__]
+        if isinstance(objs, SQLiteTable):
+            slots = cls._slot_names() + [None]
+            if order_by in slots and all(p[0] in slots for p in where):
+                # Values compared the way they are stored
+                where = [(attr, op, value.strftime(TIMESTAMP_FORMAT)
+                          if type(value) is datetime else value)
+                         for attr, op, value in where]
+                return objs.select(where, order_by, descending, limit,
+                                   offset)
+
+        ids = cls._candidate_ids(objs, where)
+        indexes = INDEXES.get(cls.__name__, {})
+        lazy = not isinstance(objs, dict)
+        # The IDs already are the result if every predicate is indexed
+        resolved = lazy and all(attr == "id" or attr in indexes
+                                for attr, _, _ in where)
+        ordered = order_by is None
+        if lazy and (order_by == "id" or order_by in indexes):
+            keys = ids
+            if order_by != "id":
+                by_id = indexes[order_by][1]
+                keys = [by_id.get(obj_id, _MISSING) for obj_id in ids]
+            if not any(key is _MISSING for key in keys):
+                ids = _sorted(ids, keys, descending,
+                              stop if resolved else None)
+                ordered = True
+        if resolved and ordered:
+            # Only load the slice
+            ids = ids[offset:stop]
+            offset, stop = 0, None
+
+        tests = [(attr, _predicate(op, value)) for attr, op, value in where]
+
+        def _matches(obj):
+            if obj is None:
+                return False
+            for attr, test in tests:
+                if not test(getattr(obj, attr)):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        if ids is None:
+            candidates = list(objs.values())
+        else:
+            candidates = (objs.get(obj_id) for obj_id in ids)
+        matches = filter(_matches, candidates)
+        if not ordered:
+            matches = list(matches)
+            matches = _sorted(matches, [getattr(obj, order_by)
+                                        for obj in matches], descending,
+                              stop)
+        return list(islice(matches, offset, stop))
+
+    @classmethod
+    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Search all objects with matching attributes
+        """
+        return cls.query([(k, "==", v) for k, v in attributes.items()])
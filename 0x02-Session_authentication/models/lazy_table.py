@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+""" LazyTable module
+"""
+from collections import OrderedDict
+from typing import TypeVar, Iterable
+import json
+import threading
+
+
+class LazyTable():
+    """ ID -> object mapping keeping only file locations in memory
+
+    Objects are materialized from their location on access and kept in a
+    LRU cache of at most `cache_size` objects. A location is a
+    (file_path, offset, length, is_journal_record) tuple. Objects saved but
+    not written yet have no location and stay pinned until `locate()`.
+    The cache and file handles are shared, every access holds a lock.
+    """
+
+    def __init__(self, cls: type, cache_size: int):
+        """ Initialize an empty LazyTable for the model class `cls`
+        """
+        self._cls = cls
+        self._cache_size = max(cache_size, 1)
+        self._locations = {}
+        self._pinned = {}
+        self._cache = OrderedDict()
+        self._files = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        return len(self._locations)
+
+    def __contains__(self, obj_id: str) -> bool:
+        """ Membership test, without materializing
+        """
+        return obj_id in self._locations
+
+    def __iter__(self) -> Iterable[str]:
+        """ Iterate over a snapshot of the IDs
+        """
+        return iter(list(self._locations))
+
+    def keys(self) -> Iterable[str]:
+        """ IDs of all objects
+        """
+        return self._locations.keys()
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """ Return the object, materializing it if it isn't cached
+        """
+        with self._lock:
+            obj = self._pinned.get(obj_id)
+            if obj is not None:
+                return obj
+            obj = self._cache.get(obj_id)
+            if obj is not None:
+                self._cache.move_to_end(obj_id)
+                return obj
+            obj = self._cls(**self._read(self._locations[obj_id]))
+            self._remember(obj)
+            return obj
+
+    def get(self, obj_id: str, default=None) -> TypeVar('Base'):
+        """ Return the object or `default` if the ID is unknown
+        """
+        try:
+            return self[obj_id]
+        except KeyError:
+            return default
+
+    def __setitem__(self, obj_id: str, obj: TypeVar('Base')):
+        """ Add or replace an object, pinned until `locate()` is called
+        """
+        with self._lock:
+            self._locations[obj_id] = None
+            self._cache.pop(obj_id, None)
+            self._pinned[obj_id] = obj
+
+    def __delitem__(self, obj_id: str):
+        """ Forget an object
+        """
+        with self._lock:
+            del self._locations[obj_id]
+            self._pinned.pop(obj_id, None)
+            self._cache.pop(obj_id, None)
+
+    def values(self) -> Iterable[TypeVar('Base')]:
+        """ Generator over all objects
+        """
+        for _, obj in self.items():
+            yield obj
+
+    def items(self) -> Iterable[tuple]:
+        """ Generator over all (ID, object) pairs
+        """
+        for obj_id in list(self._locations):
+            obj = self.get(obj_id)
+            if obj is not None:
+                yield obj_id, obj
+
+    def locate(self, obj_id: str, location: tuple):
+        """ Record where an object is persisted and unpin it
+        """
+        with self._lock:
+            if obj_id not in self._locations:
+                return
+            self._locations[obj_id] = location
+            obj = self._pinned.pop(obj_id, None)
+            if obj is not None:
+                self._remember(obj)
+
+    def relocate(self, locations: dict, replace_files=None):
+        """ Record new locations of several objects at once. The files
+        they were read from are replaced by `replace_files()` first, if
+        given: readers wait until every location and file handle matches
+        the new files, and never reuse a handle opened before
+        """
+        with self._lock:
+            if replace_files is not None:
+                replace_files()
+            self.close_files()
+            for obj_id, location in locations.items():
+                self.locate(obj_id, location)
+
+    def close_files(self):
+        """ Close the file handles used to materialize objects,
+        needed once the files they point to have been replaced
+        """
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files = {}
+
+    def _remember(self, obj: TypeVar('Base')):
+        """ Put an object in the LRU cache, evicting the oldest ones
+        """
+        self._cache[obj.id] = obj
+        self._cache.move_to_end(obj.id)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _read(self, location: tuple) -> dict:
+        """ Read the JSON dictionary of an object at `location`
+        """
+        file_path, offset, length, is_record = location
+        f = self._files.get(file_path)
+        if f is None:
+            f = open(file_path, 'rb')
+            self._files[file_path] = f
+        f.seek(offset)
+        obj_json = json.loads(f.read(length))
+        if is_record:
+            return obj_json["obj"]
+        return obj_json
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+""" SQLiteTable module
+"""
+from contextlib import contextmanager
+from typing import TypeVar, Iterable, List
+import json
+import sqlite3
+import threading
+import uuid
+
+
+class SQLiteTable():
+    """ ID -> object mapping stored in a SQLite database
+
+    Each model class gets a table with the object JSON in `data` and one
+    indexed column per attribute of `__indexes__` and `__range_indexes__`,
+    holding the value as serialized in the JSON. Columns of attributes
+    added to them later are created and filled on startup. Nothing is
+    cached, every access goes to the database so that several processes
+    sharing the database file see the same objects. The database runs in
+    WAL mode so readers don't block the writer.
+    """
+
+    def __init__(self, cls: type, db_path: str):
+        """ Initialize the table of the model class `cls` in `db_path`
+        """
+        self._cls = cls
+        self._db_path = db_path
+        self._local = threading.local()
+        self._table = '"{}"'.format(cls.__name__)
+        self._columns = tuple(cls.__indexes__) + \
+            tuple(cls.__range_indexes__)
+
+        columns = "".join(', "{}"'.format(c) for c in self._columns)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS {} (id TEXT PRIMARY KEY, "
+                     "data TEXT NOT NULL{})".format(self._table, columns))
+        with self.transaction():
+            existing = [row[1] for row in conn.execute(
+                "PRAGMA table_info({})".format(self._table))]
+            for column in self._columns:
+                if column in existing:
+                    continue
+                conn.execute('ALTER TABLE {} ADD COLUMN "{}"'
+                             .format(self._table, column))
+                conn.execute("UPDATE {0} SET \"{1}\" = "
+                             "json_extract(data, '$.{1}')"
+                             .format(self._table, column))
+        for column in self._columns:
+            conn.execute('CREATE INDEX IF NOT EXISTS "ix_{}_{}" ON {} ("{}")'
+                         .format(cls.__name__, column, self._table, column))
+
+        # Version of the table bumped by triggers in the transaction of
+        # every write, the token tells apart tables recreated from scratch
+        conn.execute("CREATE TABLE IF NOT EXISTS _versions (name TEXT "
+                     "PRIMARY KEY, token TEXT NOT NULL, version INTEGER "
+                     "NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO _versions VALUES (?, ?, 0)",
+                     (cls.__name__, uuid.uuid4().hex))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute('CREATE TRIGGER IF NOT EXISTS "{0}_{1}_version" '
+                         "AFTER {1} ON {2} BEGIN UPDATE _versions SET "
+                         "version = version + 1 WHERE name = '{0}'; END"
+                         .format(cls.__name__, event, self._table))
+
+        placeholders = ", ?" * (len(self._columns) + 1)
+        updates = "".join(', "{0}" = excluded."{0}"'.format(c)
+                          for c in self._columns)
+        self._upsert = ("INSERT INTO {} (id, data{}) VALUES (?{}) "
+                        "ON CONFLICT (id) DO UPDATE SET data = excluded.data{}"
+                        .format(self._table, columns, placeholders, updates))
+
+    def _conn(self) -> sqlite3.Connection:
+        """ Connection of the current thread, in autocommit mode
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """ Groups the writes of the block in a single transaction
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _load(self, data: str) -> TypeVar('Base'):
+        """ Build an object from its stored JSON
+        """
+        return self._cls(**json.loads(data))
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        query = "SELECT COUNT(*) FROM {}".format(self._table)
+        return self._conn().execute(query).fetchone()[0]
+
+    def __contains__(self, obj_id: str) -> bool:
+        """ Membership test
+        """
+        query = "SELECT 1 FROM {} WHERE id = ?".format(self._table)
+        return self._conn().execute(query, (obj_id,)).fetchone() is not None
+
+    def __iter__(self) -> Iterable[str]:
+        """ Iterate over the IDs
+        """
+        return iter(list(self.keys()))
+
+    def keys(self) -> List[str]:
+        """ IDs of all objects
+        """
+        query = "SELECT id FROM {} ORDER BY rowid".format(self._table)
+        return [row[0] for row in self._conn().execute(query)]
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """ Return the object stored under `obj_id`
+        """
+        obj = self.get(obj_id)
+        if obj is None:
+            raise KeyError(obj_id)
+        return obj
+
+    def get(self, obj_id: str, default=None) -> TypeVar('Base'):
+        """ Return the object or `default` if the ID is unknown
+        """
+        query = "SELECT data FROM {} WHERE id = ?".format(self._table)
+        row = self._conn().execute(query, (obj_id,)).fetchone()
+        if row is None:
+            return default
+        return self._load(row[0])
+
+    def __setitem__(self, obj_id: str, obj: TypeVar('Base')):
+        """ Insert or update an object
+        """
+        obj_json = obj.to_json(True)
+        values = [obj_json.get(c) for c in self._columns]
+        self._conn().execute(self._upsert,
+                             [obj_id, json.dumps(obj_json)] + values)
+
+    def __delitem__(self, obj_id: str):
+        """ Delete an object
+        """
+        query = "DELETE FROM {} WHERE id = ?".format(self._table)
+        self._conn().execute(query, (obj_id,))
+
+    def values(self) -> Iterable[TypeVar('Base')]:
+        """ Generator over all objects
+        """
+        for _, obj in self.items():
+            yield obj
+
+    def items(self) -> Iterable[tuple]:
+        """ Generator over all (ID, object) pairs
+        """
+        query = "SELECT id, data FROM {} ORDER BY rowid".format(self._table)
+        for obj_id, data in self._conn().execute(query):
+            yield obj_id, self._load(data)
+
+    def version(self) -> str:
+        """ Token that changes on every write to the table, by any process
+        """
+        query = "SELECT token, version FROM _versions WHERE name = ?"
+        row = self._conn().execute(query, (self._cls.__name__,)).fetchone()
+        return "{}:{}".format(*row)
+
+    def _expression(self, attr: str) -> str:
+        """ SQL expression of an attribute: its column if it has one,
+        read from the JSON otherwise
+        """
+        if not attr.isidentifier():
+            raise ValueError("Invalid attribute name: {}".format(attr))
+        if attr == "id" or attr in self._columns:
+            return '"{}"'.format(attr)
+        return "json_extract(data, '$.{}')".format(attr)
+
+    def select(self, where: List[tuple], order_by: str = None,
+               descending: bool = False, limit: int = None,
+               offset: int = 0) -> List[TypeVar('Base')]:
+        """ Return the objects matching the (attribute, operator, value)
+        predicates of `where`, sorted and sliced by the database
+        """
+        clauses = []
+        params = []
+        for attr, op, value in where:
+            column = self._expression(attr)
+            if op == "==":
+                clauses.append("{} IS ?".format(column))
+                params.append(value)
+            elif op == "startswith" and value == "":
+                clauses.append("typeof({}) = 'text'".format(column))
+            elif op == "startswith":
+                # Range on the binary collation, so the index is usable
+                clauses.append("{0} >= ? AND {0} < ?".format(column))
+                params += [value, value[:-1] + chr(ord(value[-1]) + 1)]
+            else:
+                clauses.append("{} {} ?".format(column, op))
+                params.append(value)
+
+        query = "SELECT data FROM {}".format(self._table)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY "
+        if order_by is not None:
+            query += "{} {}, ".format(self._expression(order_by),
+                                      "DESC" if descending else "ASC")
+        query += "rowid LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        rows = self._conn().execute(query, params).fetchall()
+        return [self._load(row[0]) for row in rows]
@@ -9,6 +9,9 @@ import uuid
 class UserSession(Base):
     """ UserSession class
     """
+    __indexes__ = ("session_id",)
+    __range_indexes__ = ("created_at",)
+    __slots__ = ("user_id", "session_id")
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a UserSession instance
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+""" Tests of the models.base storage
+"""
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from models import base
+from models.base import iter_json_object
+from models.user import User
+
+
+class TestIterJsonObject(unittest.TestCase):
+    """ Tests of the chunked snapshot parser
+    """
+
+    def test_chunk_sizes(self):
+        """ Same pairs as json.loads whatever the chunk boundaries,
+        including inside numbers
+        """
+        doc = {"a": 12.5, "b": 1, "c": -3e-7, "d": 1.25E+10, "e": "x\"y",
+               "f": [1.5, {"g": None}], "h": True, "i": 0}
+        text = json.dumps(doc)
+        for chunk_size in range(1, len(text) + 2):
+            pairs = iter_json_object(io.StringIO(text), chunk_size)
+            self.assertEqual(dict(pairs), doc, chunk_size)
+
+    def test_offsets(self):
+        """ Offsets and lengths locate the value texts
+        """
+        text = '{"a": 12.5, "b": {"c": 1e3}}'
+        for chunk_size in (1, 3, 9):
+            for key, value, offset, length in iter_json_object(
+                    io.StringIO(text), chunk_size, with_offsets=True):
+                self.assertEqual(json.loads(text[offset:offset + length]),
+                                 value)
+
+
+class StoreTestCase(unittest.TestCase):
+    """ Runs each test in an empty temporary directory with the storage
+    settings of `settings`
+    """
+    settings = {}
+
+    def setUp(self):
+        """ Fresh User table and files
+        """
+        cwd = os.getcwd()
+        tmp = tempfile.TemporaryDirectory()
+        os.chdir(tmp.name)
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, cwd)
+        settings = dict(PERSISTENCE_MODE="snapshot", WRITE_BEHIND=0,
+                        LAZY_CACHE_SIZE=0, BACKEND="json")
+        settings.update(self.settings)
+        for name, value in settings.items():
+            patcher = mock.patch.object(base, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        base.DIRTY.pop(User, None)
+        User.load_from_file()
+
+    def reload_emails(self) -> list:
+        """ Emails of the users read back from the files
+        """
+        User.load_from_file()
+        return sorted(user.email for user in User.all())
+
+
+class TestJournal(StoreTestCase):
+    """ Journal persistence
+    """
+    settings = {"PERSISTENCE_MODE": "journal"}
+
+    def test_remove_many(self):
+        """ Bulk removals are appended to the journal, the snapshot isn't
+        rewritten
+        """
+        users = [User(email="user{}".format(i)) for i in range(3)]
+        User.save_many(users)
+        User.save_to_file()
+        with mock.patch.object(User, "save_to_file") as save_to_file:
+            self.assertEqual(User.remove_many(users[1:]), 2)
+        save_to_file.assert_not_called()
+        self.assertEqual(self.reload_emails(), ["user0"])
+
+
+class TestWriteBehind(StoreTestCase):
+    """ Write-behind in journal mode
+    """
+    settings = {"PERSISTENCE_MODE": "journal", "WRITE_BEHIND": 100}
+
+    def test_remove_many_after_save(self):
+        """ A pending save doesn't bring back an object removed in bulk
+        """
+        kept, removed = User(email="kept"), User(email="removed")
+        kept.save()
+        removed.save()
+        User.remove_many([removed])
+        User.flush()
+        self.assertEqual(self.reload_emails(), ["kept"])
+
+    def test_save_many_after_remove(self):
+        """ A pending remove doesn't drop an object saved again in bulk
+        """
+        user = User(email="user")
+        user.save()
+        User.flush()
+        user.remove()
+        User.save_many([user])
+        User.flush()
+        self.assertEqual(self.reload_emails(), ["user"])
+
+    def test_failed_flush(self):
+        """ Changes stay pending when their write fails
+        """
+        first, second = User(email="first"), User(email="second")
+        first.save()
+        with mock.patch.object(User, "_append_changes",
+                               side_effect=OSError("No space left")):
+            with self.assertRaises(OSError):
+                User.flush()
+        self.assertEqual(User.pending_writes()["changes"], 1)
+        second.save()
+        first.remove()
+        User.flush()
+        self.assertEqual(User.pending_writes()["changes"], 0)
+        self.assertEqual(self.reload_emails(), ["second"])
+
+
+class TestLazyJournalConcurrency(StoreTestCase):
+    """ Lazy table in journal mode under concurrent writers and readers
+    """
+    settings = {"PERSISTENCE_MODE": "journal", "JOURNAL_COMPACT": 20,
+                "LAZY_CACHE_SIZE": 5}
+
+    def test_stress(self):
+        """ No reader or writer fails and the files hold exactly the users
+        left, while compactions replace the files objects are read from
+        """
+        originals = [User(email="user{}".format(i)) for i in range(300)]
+        User.save_many(originals)
+        added = {}
+        added_lock = threading.Lock()
+        errors = []
+        stop_at = time.monotonic() + 2
+
+        def _run(step):
+            def _loop():
+                i = 0
+                while time.monotonic() < stop_at:
+                    try:
+                        step(i)
+                    except Exception as e:
+                        errors.append(e)
+                    i += 1
+            return threading.Thread(target=_loop)
+
+        def _add(i):
+            user = User(email="{}-{}".format(threading.get_ident(), i))
+            user.save()
+            with added_lock:
+                added[user.id] = user.email
+
+        def _rename(i):
+            user = User.get(originals[i % len(originals)].id)
+            user.first_name = str(i)
+            user.save()
+
+        def _remove(i):
+            with added_lock:
+                if len(added) < 10:
+                    return
+                obj_id = next(iter(added))
+                del added[obj_id]
+            User.get(obj_id).remove()
+
+        def _read(i):
+            User.search({"email": "user{}".format(i % 300)})
+            for user in User.all():
+                self.assertIsNotNone(user.email)
+            User.count()
+
+        threads = [_run(_add), _run(_rename), _run(_remove)] + \
+            [_run(_read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        expected = sorted([user.email for user in originals] +
+                          list(added.values()))
+        self.assertEqual(self.reload_emails(), expected)
+        for obj_id, user in base.DATA["User"].items():
+            self.assertEqual(user.id, obj_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
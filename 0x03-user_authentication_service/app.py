@@ -4,11 +4,26 @@
 from flask import Flask, jsonify, request, abort, redirect
 
 from auth import Auth
+from hash_pool import PoolFull
 
 app = Flask(__name__)
 AUTH = Auth()
 
 
+@app.errorhandler(PoolFull)
+def busy(error):
+    """Too many password hashes pending"""
+    response = jsonify({"message": "server busy, retry later"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+@app.teardown_appcontext
+def close_db_session(exception):
+    """Releases the database session of the request"""
+    AUTH.close_db_session()
+
+
 @app.route("/")
 def index():
     """GET /"""
@@ -2,18 +2,20 @@
 """Auth module"""
 
 import bcrypt
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 import uuid
 
 from db import DB
+from hash_pool import BCRYPT_ROUNDS, HASH_POOL, PoolFull, hash_rounds
 from user import User
 
 
 def _hash_password(password: str) -> bytes:
     """Takes password and returns salted hash as byte string"""
     password_bytes = password.encode("utf-8")
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
+    salt = bcrypt.gensalt(BCRYPT_ROUNDS)
+    hashed = HASH_POOL.hashpw(password_bytes, salt)
 
     return hashed
 
@@ -37,22 +39,56 @@ class Auth:
             raise ValueError(f"User {user.email} already exists.")
         except NoResultFound:
             hashed_password = _hash_password(password)
-            user = self._db.add_user(
-                    email=email,
-                    hashed_password=hashed_password
-                    )
+            try:
+                user = self._db.add_user(
+                        email=email,
+                        hashed_password=hashed_password
+                        )
+            except IntegrityError:
+                raise ValueError(f"User {email} already exists.")
             return user
 
     def valid_login(self, email: str, password: str) -> bool:
         """Validate and log user in"""
         try:
             user = self._db.find_user_by(email=email)
-            if bcrypt.checkpw(password.encode(), user.hashed_password):
+            if HASH_POOL.checkpw(password.encode(), user.hashed_password):
+                if hash_rounds(user.hashed_password) != BCRYPT_ROUNDS:
+                    self._rehash(user.id, password, user.hashed_password)
                 return True
         except NoResultFound:
             pass
         return False
 
+    def _rehash(self, user_id: int, password: str,
+                old_hash: bytes) -> None:
+        """Replaces a password hash by one of cost BCRYPT_ROUNDS in the
+        background, unless the password changes meanwhile"""
+        def _store(future):
+            try:
+                user = self._db.find_user_by(id=user_id)
+                if user.hashed_password == old_hash:
+                    self._db.update_user(
+                            user_id,
+                            hashed_password=future.result()
+                            )
+            except Exception:
+                # Best effort, retried on the next login
+                pass
+            finally:
+                self._db.close_session()
+
+        try:
+            salt = bcrypt.gensalt(BCRYPT_ROUNDS)
+            future = HASH_POOL.submit(bcrypt.hashpw, password.encode(), salt)
+        except PoolFull:
+            return
+        future.add_done_callback(_store)
+
+    def close_db_session(self) -> None:
+        """Releases the database session of the current thread"""
+        self._db.close_session()
+
     def create_session(self, email: str) -> str:
         """Creates and returns a session id"""
         try:
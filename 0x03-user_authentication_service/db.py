@@ -1,15 +1,48 @@
 #!/usr/bin/env python3
 """DB module
 """
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from sqlalchemy.pool import QueuePool
 
+from env import env_int
 from user import Base, User
 
+# DB_MODE "reset" (default) recreates the tables on every start,
+# "persistent" keeps the existing data and only creates what is missing
+DB_URL = os.getenv("DB_URL", "sqlite:///a.db")
+DB_MODE = os.getenv("DB_MODE", "reset")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """WAL lets readers run while a request writes, NORMAL sync is safe
+    with WAL and avoids a fsync per commit"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _create_missing_indexes(engine) -> None:
+    """Adds the indexes declared since an existing database was created,
+    create_all skips the tables that already exist. The unique index on
+    email can't be created while duplicate emails are stored"""
+    # Index.create(checkfirst=True) needs SQLAlchemy 1.4, the inspector
+    # also works with 1.3
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"]
+                    for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+
 
 class DB:
     """DB class
@@ -18,25 +51,69 @@ class DB:
     def __init__(self) -> None:
         """Initialize a new DB instance
         """
-        self._engine = create_engine("sqlite:///a.db")
-        Base.metadata.drop_all(self._engine)
+        sqlite = DB_URL.startswith("sqlite")
+        connect_args = {}
+        if sqlite:
+            # Pooled connections are used by one thread at a time but not
+            # always the one that opened them, hence check_same_thread
+            connect_args = {"check_same_thread": False, "timeout": 30}
+        self._engine = create_engine(
+                DB_URL,
+                connect_args=connect_args,
+                poolclass=QueuePool,
+                pool_size=env_int("DB_POOL_SIZE", 5),
+                max_overflow=env_int("DB_MAX_OVERFLOW", 10),
+                pool_pre_ping=not sqlite
+                )
+        if sqlite:
+            event.listen(self._engine, "connect", _set_sqlite_pragmas)
+        if DB_MODE != "persistent":
+            Base.metadata.drop_all(self._engine)
         Base.metadata.create_all(self._engine)
-        self.__session = None
+        _create_missing_indexes(self._engine)
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
+        self._prewarm()
+
+    def _prewarm(self) -> None:
+        """Opens every pooled connection and runs each user lookup once on
+        it, so that the first requests don't pay for connecting, the
+        connection setup and compiling the lookup statements
+        """
+        connections = [self._engine.connect()
+                       for _ in range(self._engine.pool.size())]
+        try:
+            for connection in connections:
+                session = Session(bind=connection)
+                for key, value in (("id", 0), ("email", ""),
+                                   ("session_id", ""), ("reset_token", "")):
+                    session.query(User).filter_by(**{key: value}).first()
+                session.close()
+        finally:
+            for connection in connections:
+                connection.close()
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session of the current thread
+        """
+        return self.__session()
+
+    def close_session(self) -> None:
+        """Closes the session of the current thread, returning its
+        connection to the pool
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Adds a user to the database and returns the user"""
         user = User(email=email, hashed_password=hashed_password)
         self._session.add(user)
-        self._session.commit()
+        try:
+            self._session.commit()
+        except IntegrityError:
+            # Email registered concurrently
+            self._session.rollback()
+            raise
         return user
 
     def find_user_by(self, **kwargs) -> User:
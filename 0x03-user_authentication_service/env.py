@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+"""Environment settings helpers"""
+
+import os
+
+
+def env_int(name: str, default: int = 0) -> int:
+    """Integer value of an environment variable, `default` if unset or
+    invalid"""
+    try:
+        return int(os.getenv(name, str(default)))
+    except (ValueError, TypeError):
+        return default
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Bounded worker pool for bcrypt hashing and verification"""
+
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+import os
+import sys
+import threading
+import time
+
+import bcrypt
+
+from env import env_int
+
+
+class PoolFull(Exception):
+    """Raised when too many bcrypt calls are already waiting"""
+
+
+class HashPool:
+    """Runs bcrypt calls on a fixed number of workers.
+
+    bcrypt releases the GIL, so threads hash in parallel; processes can be
+    used instead. At most `queue_limit` calls are running or waiting, more
+    fail at once with PoolFull instead of queuing behind the others.
+    """
+
+    def __init__(self, workers: int = 0, queue_limit: int = 0,
+                 kind: str = "thread") -> None:
+        """Initialize a pool, `workers` defaults to the number of CPUs and
+        `queue_limit` to 4 calls per worker"""
+        self.workers = workers if workers > 0 else os.cpu_count() or 1
+        self.queue_limit = queue_limit if queue_limit > 0 \
+            else 4 * self.workers
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="bcrypt"
+                    )
+        self._slots = threading.BoundedSemaphore(self.queue_limit)
+
+    def submit(self, func, *args) -> Future:
+        """Schedules func(*args) on a worker without waiting for it"""
+        if not self._slots.acquire(blocking=False):
+            raise PoolFull()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hashpw(self, password: bytes, salt: bytes) -> bytes:
+        """bcrypt.hashpw on a worker"""
+        return self.submit(bcrypt.hashpw, password, salt).result()
+
+    def checkpw(self, password: bytes, hashed_password: bytes) -> bool:
+        """bcrypt.checkpw on a worker"""
+        return self.submit(bcrypt.checkpw, password,
+                           hashed_password).result()
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """Cost factor of a bcrypt hash ("$2b$<rounds>$..."), 0 if unknown"""
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode()
+    try:
+        return int(hashed_password.split(b"$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def calibrate_rounds(target_ms: float) -> int:
+    """Highest cost factor whose verification takes at most `target_ms`
+    milliseconds on this host, at least the bcrypt minimum of 4"""
+    rounds = 4
+    while rounds < 31:
+        hashed = bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds + 1))
+        start = time.perf_counter()
+        bcrypt.checkpw(b"calibration", hashed)
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        rounds += 1
+    return rounds
+
+
+BCRYPT_ROUNDS = env_int("BCRYPT_ROUNDS", 12)
+if not 4 <= BCRYPT_ROUNDS <= 31:
+    BCRYPT_ROUNDS = 12
+
+HASH_POOL = HashPool(
+        env_int("BCRYPT_WORKERS"),
+        env_int("BCRYPT_QUEUE_LIMIT"),
+        os.getenv("BCRYPT_POOL", "thread")
+        )
+
+
+if __name__ == "__main__":
+    # Usage: ./hash_pool.py [target verification latency in ms]
+    target = float(sys.argv[1]) if len(sys.argv) > 1 else 250
+    print(f"BCRYPT_ROUNDS={calibrate_rounds(target)}")